@@ -15,25 +15,62 @@ Algorithm:
 
 This method is >100x faster than running the filter on the original
 full-resolution data.
+
+Outputs (next to INPUT_FILE):
+    <name>_binned_FxT.npy              binned spectrogram (float32)
+    <name>_binned_FxT_mask_packed.npy  outlier mask, bit-packed along time
+                                       (np.packbits(mask, axis=1), uint8)
+
+The packed mask is not an image: load it with load_outlier_mask(). The
+'cleaned' and 'bursts' arrays are rebuilt from the two files, e.g.
+
+    python plot_npy.py <name>_binned_FxT.npy
+
+    from cont_3sig import load_cleaned, load_bursts
+    from plot_npy import plot_spectrogram
+    plot_spectrogram(load_bursts("<name>_binned_FxT.npy"))
 ===============================================================================
 """
 
 import numpy as np
+import numexpr as ne
 from scipy.ndimage import median_filter
+from concurrent.futures import ThreadPoolExecutor
 import os
 import sys
 
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    # numba and bottleneck are optional (not in requirements.txt). Without
+    # numba the kernels below define as plain Python and are never called:
+    # rolling_median_filter() uses bottleneck or threaded scipy, the outlier
+    # test uses numexpr and load_cleaned() unpacks the mask with NumPy
+    HAVE_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+try:
+    import bottleneck as bn
+    HAVE_BOTTLENECK = True
+except ImportError:
+    HAVE_BOTTLENECK = False
+
 def bin_spectrogram(array, freq_factor, time_factor):
     """
     Downsamples a 2D array by averaging blocks of (freq_factor, time_factor).
     
     Args:
-        array (np.ndarray): The 2D (frequency, time) data.
+        array (np.ndarray): The 2D (frequency, time) data. May be a
+            memory-mapped array (np.load(..., mmap_mode='r')).
         freq_factor (int): How many frequency bins to average together.
         time_factor (int): How many time steps to average together.
 
     Returns:
-        np.ndarray: The new, smaller, binned array.
+        np.ndarray: The new, smaller, binned array (float32).
     """
     print(f"Original shape: {array.shape}")
     print(f"Binning by: ({freq_factor} freqs, {time_factor} time steps)")
@@ -48,17 +85,174 @@ def bin_spectrogram(array, freq_factor, time_factor):
     if time_trim > 0:
         array = array[:, :-time_trim]
         
-    # --- 3. Reshape and Bin ---
-    # (freq, time) -> (freq_chunks, freq_factor, time_chunks, time_factor)
-    binned_shape = (array.shape[0] // freq_factor, freq_factor, 
-                    array.shape[1] // time_factor, time_factor)
-    
-    # Reshape and then average over both the new axes (1 and 3)
-    binned_array = array.reshape(binned_shape).mean(axis=(1, 3))
+    # --- 3. Reshape and Bin, one frequency block at a time ---
+    # Only freq_factor rows are read at once, so a memory-mapped input is
+    # never fully loaded and each block stays small enough to be cache-friendly
+    n_freq_bins = array.shape[0] // freq_factor
+    n_time_bins = array.shape[1] // time_factor
+    binned_array = np.empty((n_freq_bins, n_time_bins), dtype=np.float32)
+
+    for i in range(n_freq_bins):
+        # (any float64/integer input is cast to float32 during this copy)
+        block = np.ascontiguousarray(array[i * freq_factor:(i + 1) * freq_factor],
+                                     dtype=np.float32)
+        # (freq_factor, time) -> (freq_factor, time_chunks, time_factor),
+        # then sum over axes 0 and 2 in a single pass
+        block = block.reshape(freq_factor, n_time_bins, time_factor)
+        np.einsum('jkl->k', block, out=binned_array[i], optimize=True)
+
+    binned_array *= 1.0 / (freq_factor * time_factor)
     
     print(f"New binned shape: {binned_array.shape}")
     return binned_array
 
+@njit(cache=True)
+def _reflect_index(k, n):
+    """
+    Maps an out-of-range index back into [0, n) the same way
+    scipy.ndimage's 'reflect' mode does: (d c b a | a b c d | d c b a).
+    """
+    while k < 0 or k >= n:
+        if k < 0:
+            k = -k - 1
+        else:
+            k = 2 * n - k - 1
+    return k
+
+@njit(parallel=True, cache=True)
+def median_filter_numba(arr, window_size):
+    """
+    Rolling median along the time axis of a 2D (frequency, time) array.
+
+    Gives the same result as median_filter(arr, size=(1, window_size),
+    mode='reflect') for an odd window_size. Each frequency row is handled
+    in parallel and keeps a sorted copy of its window: sliding the window
+    by one step swaps a single value in place instead of re-sorting.
+
+    Rows must be finite: a NaN cannot be ordered, so it corrupts the sorted
+    window. rolling_median_filter() sends rows with NaN/Inf to scipy instead.
+
+    Args:
+        arr (np.ndarray): The 2D (frequency, time) data.
+        window_size (int): Odd window length, in time steps.
+
+    Returns:
+        np.ndarray: The rolling median, same shape and dtype as arr.
+    """
+    n_freq, n_time = arr.shape
+    half = window_size // 2
+    out = np.empty_like(arr)
+
+    for i in prange(n_freq):
+        row = arr[i]
+        window = np.empty(window_size, dtype=arr.dtype)
+
+        # --- 1. Sort the window centred on the first time step ---
+        for k in range(window_size):
+            window[k] = row[_reflect_index(k - half, n_time)]
+        window.sort()
+        out[i, 0] = window[half]
+
+        # --- 2. Slide: drop the oldest value, insert the newest ---
+        for j in range(1, n_time):
+            old = row[_reflect_index(j - half - 1, n_time)]
+            new = row[_reflect_index(j + half, n_time)]
+
+            pos = np.searchsorted(window, old)
+            if pos >= window_size:
+                pos = window_size - 1
+
+            # shift neighbours over the freed slot until new fits in order
+            if new > old:
+                while pos + 1 < window_size and window[pos + 1] < new:
+                    window[pos] = window[pos + 1]
+                    pos += 1
+            else:
+                while pos > 0 and window[pos - 1] > new:
+                    window[pos] = window[pos - 1]
+                    pos -= 1
+            window[pos] = new
+
+            out[i, j] = window[half]
+
+    return out
+
+@njit(parallel=True, cache=True)
+def outlier_mask_numba(difference, rolling_mad, sigma_threshold):
+    """
+    Flags points whose deviation exceeds sigma_threshold robust sigmas.
+
+    Computes difference > sigma_threshold * max(1.4826 * rolling_mad, 1e-6)
+    in one streaming pass, writing the boolean mask directly.
+    """
+    n_freq, n_time = difference.shape
+    out = np.empty((n_freq, n_time), dtype=np.bool_)
+
+    for i in prange(n_freq):
+        for j in range(n_time):
+            sigma = 1.4826 * rolling_mad[i, j]
+            if sigma < 1e-6:
+                sigma = 1e-6
+            out[i, j] = difference[i, j] > sigma_threshold * sigma
+
+    return out
+
+def median_filter_threaded(arr, window_size):
+    """
+    Rolling median along the time axis using scipy's median_filter.
+
+    The (1, window_size) footprint never crosses frequency rows, so the
+    array is split into row blocks that are filtered concurrently; scipy's
+    ndimage releases the GIL, so the threads run on separate cores.
+    """
+    n_blocks = max(1, min(os.cpu_count() or 1, arr.shape[0]))
+
+    def _mf_chunk(sub):
+        return median_filter(sub, size=(1, window_size), mode='reflect')
+
+    with ThreadPoolExecutor(max_workers=n_blocks) as pool:
+        blocks = list(pool.map(_mf_chunk, np.array_split(arr, n_blocks, axis=0)))
+    return np.concatenate(blocks, axis=0)
+
+def median_filter_bottleneck(arr, window_size):
+    """
+    Rolling median along the time axis using bottleneck.move_median.
+
+    move_median is a trailing window, so each row is first reflect-padded by
+    window_size // 2 on both sides; dropping the first window_size - 1
+    outputs then leaves the centred median, matching scipy's 'reflect' mode
+    for finite data. With the default min_count=window_size, one NaN blanks
+    every output whose window contains it (scipy gives a single NaN), so
+    rolling_median_filter() only passes finite rows here.
+    """
+    half = window_size // 2
+    padded = np.pad(arr, ((0, 0), (half, half)), mode='symmetric')
+    trailing = bn.move_median(padded, window=window_size, axis=1)
+    return np.ascontiguousarray(trailing[:, window_size - 1:])
+
+def rolling_median_filter(arr, window_size):
+    """
+    Rolling median along the time axis, reflect-padded at the edges.
+    Uses the numba kernel when numba is installed, then bottleneck,
+    else threaded scipy.
+    """
+    if HAVE_NUMBA:
+        fast_filter = median_filter_numba
+    elif HAVE_BOTTLENECK:
+        fast_filter = median_filter_bottleneck
+    else:
+        return median_filter_threaded(arr, window_size)
+
+    # NaN-padded rows (missing frequency bins) go to scipy, which is what
+    # the fast paths are checked against; they only agree on finite rows
+    finite_rows = np.isfinite(arr).all(axis=1)
+    if finite_rows.all():
+        return fast_filter(arr, window_size)
+    out = np.empty_like(arr)
+    out[finite_rows] = fast_filter(arr[finite_rows], window_size)
+    out[~finite_rows] = median_filter_threaded(arr[~finite_rows], window_size)
+    return out
+
 def apply_robust_clip(spectrogram, window_size, sigma_threshold=3):
     """
     Applies a robust median clip (MAD) to the spectrogram.
@@ -66,34 +260,109 @@ def apply_robust_clip(spectrogram, window_size, sigma_threshold=3):
     """
     if window_size % 2 == 0:
         raise ValueError("window_size must be an odd number.")
-        
+
+    # Both median passes and the MAD math are memory-bound, so keep the whole
+    # pipeline in float32 (float16 is not supported by numba or scipy.ndimage)
+    spectrogram = np.ascontiguousarray(spectrogram, dtype=np.float32)
+
     print(f"Calculating rolling median with window size {window_size}...")
-    # This optimized 2D filter is much faster than a Python loop
-    rolling_median = median_filter(
-        spectrogram, 
-        size=(1, window_size), 
-        mode='reflect'
-    )
-    
+    # Each frequency row is filtered independently, all rows in parallel
+    rolling_median = rolling_median_filter(spectrogram, window_size)
+
     print("Calculating rolling MAD...")
-    difference = np.abs(spectrogram - rolling_median)
-    
-    rolling_mad = median_filter(
-        difference, 
-        size=(1, window_size), 
-        mode='reflect'
-    )
-    
+    difference = ne.evaluate("abs(spectrogram - rolling_median)")
+
+    rolling_mad = rolling_median_filter(difference, window_size)
+
     print("Identifying outliers...")
-    # 1.4826 makes MAD equivalent to 1 standard deviation
-    sigma_equivalent = 1.4826 * rolling_mad
-    sigma_equivalent[sigma_equivalent < 1e-6] = 1e-6 # Avoid div by zero
-    
-    is_outlier = difference > (sigma_threshold * sigma_equivalent)
+    # 1.4826 makes MAD equivalent to 1 standard deviation, floored at 1e-6
+    # to avoid div by zero; either path is one fused pass with no temps
+    if HAVE_NUMBA:
+        is_outlier = outlier_mask_numba(difference, rolling_mad, sigma_threshold)
+    else:
+        is_outlier = ne.evaluate(
+            "difference > sigma_threshold * "
+            "where(1.4826 * rolling_mad < 1e-6, 1e-6, 1.4826 * rolling_mad)"
+        )
     
     print("Done.")
     return is_outlier
 
+def count_packed(packed_mask):
+    """
+    Counts the True points in a bit-packed mask (np.packbits output) by
+    popcounting each byte, so the full boolean mask is never re-read.
+    """
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+        return int(np.bitwise_count(packed_mask).sum(dtype=np.int64))
+    return int(np.unpackbits(packed_mask).sum(dtype=np.int64))
+
+@njit(parallel=True, cache=True)
+def fill_packed_numba(arr, packed_mask, fill_value):
+    """
+    Sets arr[i, j] = fill_value wherever bit j of row i is set in a mask
+    packed with np.packbits(mask, axis=1). Works in place, rows in parallel,
+    reading the packed bits directly instead of an unpacked boolean copy.
+    """
+    n_freq, n_time = arr.shape
+    for i in prange(n_freq):
+        for j in range(n_time):
+            if packed_mask[i, j >> 3] & (128 >> (j & 7)):
+                arr[i, j] = fill_value
+
+def load_outlier_mask(mask_path, shape):
+    """
+    Loads a bit-packed outlier mask saved by this script.
+
+    Args:
+        mask_path (str): Path to the *_mask_packed.npy file (np.packbits
+            along time).
+        shape (tuple): Shape of the binned spectrogram the mask belongs to.
+
+    Returns:
+        np.ndarray: Boolean mask, True where a point was flagged as an outlier.
+    """
+    packed = np.load(mask_path, allow_pickle=False)
+    return np.unpackbits(packed, axis=1, count=shape[1]).astype(bool)
+
+def load_cleaned(binned_path):
+    """
+    Rebuilds the 'cleaned' spectrogram (outliers replaced with NaN) from a
+    saved binned spectrogram and its *_mask_packed.npy file next to it.
+
+    Args:
+        binned_path (str): Path to the binned spectrogram .npy file.
+
+    Returns:
+        np.ndarray: The binned spectrogram with outliers set to NaN.
+    """
+    cleaned = np.load(binned_path, allow_pickle=False)
+    mask_path = f"{os.path.splitext(binned_path)[0]}_mask_packed.npy"
+
+    if HAVE_NUMBA:
+        # one pass straight from the packed bits, no boolean mask allocated
+        fill_packed_numba(cleaned, np.load(mask_path, allow_pickle=False), np.nan)
+    else:
+        cleaned[load_outlier_mask(mask_path, cleaned.shape)] = np.nan
+    return cleaned
+
+def load_bursts(binned_path):
+    """
+    Rebuilds the 'bursts' spectrogram (only the outliers kept, everything
+    else NaN) from a saved binned spectrogram and its *_mask_packed.npy file.
+
+    Args:
+        binned_path (str): Path to the binned spectrogram .npy file.
+
+    Returns:
+        np.ndarray: The binned spectrogram with non-outliers set to NaN.
+    """
+    binned = np.load(binned_path, allow_pickle=False)
+    mask_path = f"{os.path.splitext(binned_path)[0]}_mask_packed.npy"
+    outlier_mask = load_outlier_mask(mask_path, binned.shape)
+    # single fused select instead of a NaN fill followed by a scatter copy
+    return np.where(outlier_mask, binned, np.float32(np.nan))
+
 # --- MAIN EXECUTION ---
 if __name__ == "__main__":
     
@@ -145,7 +414,8 @@ if __name__ == "__main__":
         sys.exit(1)
         
     print(f"\nLoading data from {INPUT_FILE}...")
-    spectrogram_data = np.load(INPUT_FILE)
+    # memory-mapped: bin_spectrogram only pages in a few rows at a time
+    spectrogram_data = np.load(INPUT_FILE, mmap_mode='r')
 
     # --- 4. Bin Data ---
     binned_spectrogram = bin_spectrogram(spectrogram_data, FREQ_BIN_FACTOR, TIME_BIN_FACTOR)
@@ -155,8 +425,12 @@ if __name__ == "__main__":
     outlier_mask = apply_robust_clip(binned_spectrogram, NEW_WINDOW_SIZE, SIGMA_THRESHOLD)
 
     # --- 6. Show Results ---
+    # Pack the mask once along time (8 points per byte): it is what gets
+    # saved, and counting set bits in it reads 8x fewer bytes
+    packed_mask = np.packbits(outlier_mask, axis=1)
+
     total_points = binned_spectrogram.size
-    total_outliers = np.sum(outlier_mask)
+    total_outliers = count_packed(packed_mask)
     percent_outliers = 100 * total_outliers / total_points
 
     print("\n--- Results (on binned data) ---")
@@ -173,43 +447,25 @@ if __name__ == "__main__":
 
     # Define all output paths
     binned_path = os.path.join(save_dir, f"{base_name}{suffix}.npy")
-    cleaned_path = os.path.join(save_dir, f"{base_name}{suffix}_cleaned.npy")
-    mask_path = os.path.join(save_dir, f"{base_name}{suffix}_mask.npy")
-    burst_path = os.path.join(save_dir, f"{base_name}{suffix}_bursts.npy")
+    # "_mask_packed", not "_mask": the file is uint8 bits, not the old bool
+    # map, so readers of the old format don't find it and misread it
+    mask_path = os.path.join(save_dir, f"{base_name}{suffix}_mask_packed.npy")
 
     try:
-        # Create the 'cleaned' and 'bursts' arrays from the binned data
-        cleaned_data = np.copy(binned_spectrogram)
-        cleaned_data[outlier_mask] = np.nan
-
-        burst_data = np.full_like(binned_spectrogram, np.nan)
-        burst_data[outlier_mask] = binned_spectrogram[outlier_mask]
-        
-        # save all four files
+        # The 'cleaned' and 'bursts' arrays are fully determined by the binned
+        # data + mask, so only those two are saved; see load_cleaned() and
+        # load_bursts()
         print(f"Saving binned spectrogram to {binned_path}...")
-        np.save(binned_path, binned_spectrogram)
+        np.save(binned_path, binned_spectrogram, allow_pickle=False)
         """
         new binned spectrogram 
         """
-        
-        print(f"Saving cleaned data to {cleaned_path}...")
-        np.save(cleaned_path, cleaned_data)
-        """
-        burst detection removed noise display only
-        for purposes of studying the quiet data
-        T replaced with NaN
-        """
-        
+
         print(f"Saving outlier mask to {mask_path}...")
-        np.save(mask_path, outlier_mask)
+        np.save(mask_path, packed_mask, allow_pickle=False)
         """
         if above n-sigma, highlighted (T/F 1/0 binary map)
-        """
-
-        print(f"Saving burst data to {burst_path}...")
-        np.save(burst_path, burst_data)
-        """
-        burst detection display only
+        bit-packed (8 points per byte), read back with load_outlier_mask()
         """
 
         print("\nFiles saved successfully")
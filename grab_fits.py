@@ -5,12 +5,17 @@ import io
 import os
 import requests
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from astropy.io import fits
 from urllib.parse import urljoin
 from tqdm import tqdm
 
+# e-CALLISTO filenames: STATION_YYYYMMDD_HHMMSS_NN.fit.gz (compiled once, at import)
+_FILE_RE = re.compile(r"^([A-Z0-9\-_]+)_(\d{8})_.*\.fit\.gz$")
+
 def get_date_directory_url(year, month, day):
     """
     Constructs the URL for a specific year and month directory.
@@ -57,17 +62,17 @@ def get_files_for_day(year, month, day):
     # --- 2. Find all stations with data for the specified day ---
     station_names = set() # empty set to store the unique names of the radio stations
     files_for_day = [] # empty list to hold the filenames that match the target day
-    file_pattern = re.compile(r"^([A-Z0-9\-_]+)_(\d{8})_.*\.fit\.gz$") # regex pattern to match filenames
-
-    for link in soup.find_all('a'): # iterate over all <a> tags in the HTML (hyperlink) found by bs4 on page
-        href = link.get('href') # get the destination of the link, which is stored in its 'href' attribute
-        if href: # safety check to make sure the link has an href attribute before we process it
-            match = file_pattern.match(href) # match re-compiled regular expression against the href filename, will return a 'match' object if the filename fits expected format
-            if match: # if the filename matches the pattern
-                station, date_str = match.groups()  # extract the captured parts from regex, group 1 is the station name, and group 2 is the 8-digit date string
-                if date_str == date_to_match: # check if the date from the filename is the specific date we are searching for
-                    station_names.add(station) # if it's the right date, add the station name to our set of unique stations
-                    files_for_day.append(href) # also, add the full filename to our list of files for that day.
+
+    for link in soup.find_all('a', href=True): # iterate over all <a> tags in the HTML (hyperlink) that have an 'href' attribute (bs4 filters the rest out)
+        href = link['href'] # get the destination of the link, which is stored in its 'href' attribute
+        if not href.endswith('.fit.gz') or date_to_match not in href: # cheap string check first, skips sort headers, parent links, other days
+            continue
+        match = _FILE_RE.match(href) # match the pre-compiled regular expression against the href filename, will return a 'match' object if the filename fits expected format
+        if match: # if the filename matches the pattern
+            station, date_str = match.groups()  # extract the captured parts from regex, group 1 is the station name, and group 2 is the 8-digit date string
+            if date_str == date_to_match: # check if the date from the filename is the specific date we are searching for
+                station_names.add(station) # if it's the right date, add the station name to our set of unique stations
+                files_for_day.append(href) # also, add the full filename to our list of files for that day.
 
     if not station_names: # check if the 'station_names' set is empty after scanning all the links
         return f"No stations found with data for {year}-{month_str}-{day_str}." # if it is empty, it means no files matched our target date, function halted
@@ -105,9 +110,111 @@ def get_files_for_day(year, month, day):
 
 
 
-def files_to_numpy(station: str, year: str, month: str, day: str, time_offset: str = "000000"):
+def _make_session(pool_size):
+    """
+    Creates a keep-alive requests.Session whose connection pool holds
+    pool_size connections, so that many threads can share it.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def probe_files_for_day(station, year, month, day, focus_code="01", max_workers=16):
+    """
+    Finds a station's files for one day without parsing the directory page.
+
+    e-CALLISTO files are named STATION_YYYYMMDD_HHMMSS_NN.fit.gz at a
+    15-minute cadence, so the 96 candidate URLs are built directly and
+    checked with concurrent HEAD requests; only the ones that exist are kept.
+
+    Args:
+        station (str): Station name, e.g. "ALASKA-ANCHORAGE".
+        year, month, day (int or str): The date to probe.
+        focus_code (str): The trailing 2-digit focus code of the files.
+        max_workers (int): Number of concurrent HEAD requests.
+
+    Returns:
+        list: Full URLs of the files that exist, in time order.
+    """
+    year, month, day = int(year), int(month), int(day)
+    base_url = "https://soleil.i4ds.ch/solarradio/data/2002-20yy_Callisto"
+    dir_url = f"{base_url}/{year:04d}/{month:02d}/{day:02d}/"
+    date_str = f"{year:04d}{month:02d}{day:02d}"
+
+    candidates = [
+        f"{dir_url}{station}_{date_str}_{h:02d}{m:02d}00_{focus_code}.fit.gz"
+        for h in range(24) for m in (0, 15, 30, 45)
+    ]
+
+    session = _make_session(max_workers)
+
+    def _exists(url):
+        try:
+            return session.head(url, timeout=10).status_code == 200
+        except requests.RequestException:
+            return False
+
+    with session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        found = list(pool.map(_exists, candidates))
+
+    return [url for url, ok in zip(candidates, found) if ok]
+
+def fetch_fits_file(session, url):
+    """
+    Downloads a single .fit.gz file and decodes its FITS data.
+
+    Args:
+        session (requests.Session): Shared session, so connections are reused.
+        url (str): Full URL of the .fit.gz file.
+
+    Returns:
+        tuple: (data, start_str, end_date_str, end_time_str), with data as a
+            2D float32 array and the rest taken from the FITS header.
+    """
+    # (connect, read) timeouts: a stalled server raises instead of blocking
+    # files_to_numpy, which waits on the downloads in order
+    r = session.get(url, timeout=(10, 60))
+    r.raise_for_status()
+    # astropy reads straight from the GzipFile, so the decompressed bytes
+    # are never buffered separately (memmap is useless for in-memory data)
+    with fits.open(gzip.GzipFile(fileobj=io.BytesIO(r.content)), memmap=False) as hdul:
+        data = hdul[0].data
+        if data.ndim == 1:
+            data = np.atleast_2d(data)
+        # only copies when a dtype/byte-order conversion is actually needed
+        data = np.ascontiguousarray(data, dtype=np.float32)
+
+        header = hdul[0].header
+        start_str = f"{header['DATE-OBS']} {header['TIME-OBS']}"
+        end_date_str, end_time_str = header['DATE-END'], header['TIME-END']
+
+    return data, start_str, end_date_str, end_time_str
+
+def parse_header_times(start_str, end_date_str, end_time_str):
+    """
+    Converts the FITS header date/time strings of one file into datetimes.
+
+    Returns:
+        tuple: (start, end) as datetime objects. An end time of "24:00..."
+            is rolled over to midnight of the following day.
+    """
+    start = datetime.fromisoformat(start_str.replace('/', '-'))
+    end_date = end_date_str.replace('/', '-')
+    if end_time_str.startswith("24:00"):
+        end = datetime.fromisoformat(end_date) + timedelta(days=1)
+    else:
+        end = datetime.fromisoformat(f"{end_date} {end_time_str}")
+    return start, end
+
+def files_to_numpy(station: str, year: str, month: str, day: str, time_offset: str = "000000",
+                   max_workers: int = 8, urls: list = None, probe: bool = False):
     """
     Downloads and processes e-CALLISTO files into a single NumPy array with a progress bar.
+    Files are fetched concurrently over a shared keep-alive session (max_workers threads).
+    If urls is given (e.g. from get_files_for_day), the directory listing is not fetched again.
+    If probe is True, the file URLs are found with probe_files_for_day() instead of the listing.
     """
     # --- Convert string inputs to integers for formatting ---
     year = int(year)
@@ -122,20 +229,26 @@ def files_to_numpy(station: str, year: str, month: str, day: str, time_offset: s
     dir_url = urljoin(base_url, path)
     date_str_match = f"{year:04d}{month:02d}{day:02d}"
 
-    try:
-        response = requests.get(dir_url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-    except requests.RequestException as e:
-        print(f"Error: Could not access the directory at {dir_url}. Details: {e}")
-        return None, None
+    if urls is None and probe:
+        urls = probe_files_for_day(station, year, month, day)
 
-    all_files = [urljoin(dir_url, a['href']) for a in soup.find_all('a', href=True)]
-    
-    station_files = [
-        f for f in all_files 
-        if station in f and date_str_match in f and f.endswith(".fit.gz")
-    ]
+    if urls is not None:
+        station_files = list(urls)
+    else:
+        try:
+            response = requests.get(dir_url)
+            response.raise_for_status()
+            soup = BeautifulSoup(response.text, "html.parser")
+        except requests.RequestException as e:
+            print(f"Error: Could not access the directory at {dir_url}. Details: {e}")
+            return None, None
+
+        all_files = [urljoin(dir_url, a['href']) for a in soup.find_all('a', href=True)]
+
+        station_files = [
+            f for f in all_files
+            if station in f and date_str_match in f and f.endswith(".fit.gz")
+        ]
 
     if not station_files:
         print(f"Error: No files found for station '{station}' on {year}-{month}-{day} at {dir_url}")
@@ -162,58 +275,54 @@ def files_to_numpy(station: str, year: str, month: str, day: str, time_offset: s
 
     # --- 3. Process Files into NumPy arrays ---
     data_chunks = []
-    overall_start_time, overall_end_time = None, None
-
-    # The loop is now wrapped in tqdm() to create the progress bar
-    for url in tqdm(sorted_urls, desc=f"Processing files for {station}"):
-        try:
-            r = requests.get(url, stream=True)
-            r.raise_for_status()
-            with gzip.GzipFile(fileobj=io.BytesIO(r.content)) as gz:
-                with fits.open(io.BytesIO(gz.read())) as hdul:
-                    data = hdul[0].data
-                    if data.ndim == 1:
-                        data = np.atleast_2d(data)
-                    data_chunks.append(np.array(data, dtype=np.float32))
-
-                    header = hdul[0].header
-                    start_str = f"{header['DATE-OBS']} {header['TIME-OBS']}"
-                    end_date_str, end_time_str = header['DATE-END'], header['TIME-END']
-                    
-                    current_start = datetime.fromisoformat(start_str.replace('/', '-'))
-                    if end_time_str.startswith("24:00"):
-                        current_end = datetime.fromisoformat(end_date_str.replace('/', '-')) + timedelta(days=1)
-                    else:
-                        current_end = datetime.fromisoformat(f"{end_date_str.replace('/', '-')} {end_time_str}")
-
-                    if overall_start_time is None or current_start < overall_start_time:
-                        overall_start_time = current_start
-                    if overall_end_time is None or current_end > overall_end_time:
-                        overall_end_time = current_end
-        except Exception as e:
-            # Using tqdm.write is better for printing during a loop
-            tqdm.write(f"\nWarning: Skipping file {os.path.basename(url)} due to error: {e}")
-            continue
+    header_times = [] # raw (url, start_str, end_date_str, end_time_str), parsed after the loop
+
+    # One keep-alive session for every file, so each download skips the TCP/TLS handshake
+    session = _make_session(max_workers)
+
+    # Downloads (and FITS decoding) overlap on the thread pool; results are
+    # still collected in sorted_urls order, wrapped in tqdm() for the progress bar
+    with session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(fetch_fits_file, session, url) for url in sorted_urls]
+        for url, future in tqdm(zip(sorted_urls, futures), total=len(futures),
+                                desc=f"Processing files for {station}"):
+            try:
+                data, start_str, end_date_str, end_time_str = future.result()
+                data_chunks.append(data)
+                header_times.append((url, start_str, end_date_str, end_time_str))
+            except Exception as e:
+                # Using tqdm.write is better for printing during a loop
+                tqdm.write(f"\nWarning: Skipping file {os.path.basename(url)} due to error: {e}")
+                continue
 
     if not data_chunks:
         print("Error: No valid FITS data could be processed.")
         return None, None
 
+    # --- Overall time range: parse every header once, then a single min/max ---
+    file_times = []
+    for url, start_str, end_date_str, end_time_str in header_times:
+        try:
+            file_times.append(parse_header_times(start_str, end_date_str, end_time_str))
+        except ValueError as e:
+            print(f"Warning: Could not parse header times of {os.path.basename(url)}: {e}")
+
+    overall_start_time = min((start for start, _ in file_times), default=None)
+    overall_end_time = max((end for _, end in file_times), default=None)
+
     # --- 4. Standardize Dimensions and Concatenate ---
     max_freq_bins = max(chunk.shape[0] for chunk in data_chunks)
-    
-    padded_chunks = []
+    total_time_steps = sum(chunk.shape[1] for chunk in data_chunks)
+
+    # Allocate the final array once (NaN marks missing frequency bins) and
+    # copy each chunk into its time slot, instead of padding then concatenating.
+    # Chunks are written upside down so frequency increases with row index;
+    # the flip costs nothing extra and the result is C-contiguous.
+    full_spectrogram = np.full((max_freq_bins, total_time_steps), np.nan, dtype=np.float32)
+    t0 = 0
     for chunk in data_chunks:
-        if chunk.shape[0] < max_freq_bins:
-            padding_height = max_freq_bins - chunk.shape[0]
-            pad_block = np.full((padding_height, chunk.shape[1]), np.nan, dtype=np.float32)
-            padded_chunk = np.vstack([chunk, pad_block])
-            padded_chunks.append(padded_chunk)
-        else:
-            padded_chunks.append(chunk)
-
-    full_spectrogram = np.concatenate(padded_chunks, axis=1)
-    full_spectrogram = np.flipud(full_spectrogram)
+        full_spectrogram[max_freq_bins - chunk.shape[0]:, t0:t0 + chunk.shape[1]] = chunk[::-1]
+        t0 += chunk.shape[1]
 
     metadata = {
         "station": station,
@@ -268,8 +377,8 @@ if __name__ == "__main__":
 
     # Print the results
     if isinstance(file_links, list):
-        # Call the processing function as before
-        final_numpy_array, summary_metadata = files_to_numpy(station_name, year, month, day)
+        # Pass the URLs along so files_to_numpy doesn't re-fetch the directory page
+        final_numpy_array, summary_metadata = files_to_numpy(station_name, year, month, day, urls=file_links)
 
         # If processing was successful, print the summary and save the file
         if final_numpy_array is not None:
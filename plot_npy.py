@@ -10,48 +10,274 @@ This script loads a 2D spectrogram stored as a .npy file and plots it using
 matplotlib. The spectrogram is displayed with frequency on the y-axis and 
 time on the x-axis, with intensity represented by color. 
 """
+import argparse
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import warnings
+import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.colors import Normalize
+from numpy.lib.format import open_memmap
 
-def plot_spectrogram(big_array: np.ndarray, label_file=None, cmap="viridis"):
-    """Plot a spectrogram: frequency (y) vs. time (x), intensity in color."""
-    plt.figure(figsize=(12, 6))
-    plt.imshow(
-        big_array,
-        aspect="auto",
-        origin="lower",
-        cmap=cmap
-    )
-    plt.colorbar(label="Intensity")
-    plt.xlabel("Time index")
-    plt.ylabel("Frequency bin")
-    plt.title("Spectrogram")
+# Built-in matplotlib backends that can only write files, never open a window
+_NON_INTERACTIVE_BACKENDS = {"agg", "cairo", "pdf", "pgf", "ps", "svg", "template"}
+
+def _has_display() -> bool:
+    """False on Linux when neither an X11 nor a Wayland display is available."""
+    if not sys.platform.startswith("linux"):
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+# Colormap lookups and Normalize objects are reused across plot_spectrogram
+# calls, so batch plotting doesn't rebuild them for every file
+_get_cmap = lru_cache(maxsize=16)(plt.get_cmap)
+
+@lru_cache(maxsize=16)
+def _cached_norm(vmin: float, vmax: float) -> Normalize:
+    return Normalize(vmin, vmax)
+
+def _get_norm(vmin: float, vmax: float) -> Normalize:
+    """Return a shared Normalize for (vmin, vmax), rounded to 6 significant digits."""
+    return _cached_norm(float(f"{vmin:.6g}"), float(f"{vmax:.6g}"))
+
+# Burst labels as a structured array: loads without pickle (and can be
+# memory-mapped), and the columns can be read as whole arrays
+BURST_LABEL_DTYPE = np.dtype([("start_idx", "i8"), ("end_idx", "i8")])
+
+def load_burst_labels(label_file) -> np.ndarray:
+    """Load burst labels as a BURST_LABEL_DTYPE structured array.
+
+    Legacy label files (object arrays of {"start_idx", "end_idx"} dicts)
+    are still read, via pickle, and converted.
+    """
+    try:
+        return np.load(label_file, mmap_mode="r")
+    except ValueError:
+        legacy = np.load(label_file, allow_pickle=True)
+        return np.array([(entry["start_idx"], entry["end_idx"]) for entry in legacy],
+                        dtype=BURST_LABEL_DTYPE)
+
+def display_limits(image: np.ndarray, sample_size: int = 1_000_000):
+    """Colour limits (1st, 99th percentile) estimated from a random subsample.
+
+    For display, percentiles of ~1M random pixels are indistinguishable from
+    the exact ones, and cost O(sample_size) instead of a pass over the array.
+    NaN/Inf pixels are ignored.
+    """
+    flat = image.reshape(-1)
+    if flat.size > sample_size:
+        rng = np.random.default_rng(0)
+        flat = flat[np.sort(rng.integers(0, flat.size, size=sample_size))]
+    flat = flat[np.isfinite(flat)]
+    if flat.size == 0:
+        return 0.0, 1.0
+    vmin, vmax = np.percentile(flat, [1, 99])
+    return vmin, vmax
+
+def block_reduce_max(big_array: np.ndarray, by: int, bx: int) -> np.ndarray:
+    """Max over non-overlapping (by, bx) blocks, cropping any partial block.
+
+    The max (rather than the mean) keeps short bursts visible; NaNs are
+    ignored unless a whole block is NaN. The 4D reshape is a view of the
+    cropped array, so the only allocation is the output itself.
+    """
+    h, w = big_array.shape[0] // by, big_array.shape[1] // bx
+    blocks = big_array[:h * by, :w * bx].reshape(h, by, w, bx)
+    return np.fmax.reduce(blocks, axis=(1, 3))
+
+def plot_spectrogram(big_array: np.ndarray, label_file=None, cmap="viridis", resolution=None,
+                     save_path=None, ax=None, im=None, show_colorbar=True):
+    """Plot a spectrogram: frequency (y) vs. time (x), intensity in color.
+
+    Arrays much larger than the figure (by more than 2x, per axis) are
+    block-reduced to about `resolution` = (rows, cols) pixels before drawing,
+    which defaults to the figure's own pixel size. Axes keep the original
+    indices.
+
+    Spectrograms are drawn as float32: save them as C-ordered float32 (as
+    grab_fits.py does) and no conversion copy is needed.
+
+    `label_file` is a burst labels .npy path, or a label array already
+    returned by load_burst_labels().
+
+    If `save_path` is given the figure is written there instead of shown.
+
+    Pass the `im` returned by a previous call to redraw into the same figure
+    via im.set_data() (no new figure, axes or image artist), or an `ax` to
+    draw into; an existing colorbar is updated rather than re-created.
+    Returns (fig, ax, im).
+    """
+    if im is not None:
+        ax = im.axes
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(12, 6))
+    fig = ax.figure
+
+    # --- Reduce to display resolution: there is no point colormapping
+    # and resampling far more pixels than the screen can show ---
+    n_rows, n_cols = big_array.shape
+    if resolution is None:
+        resolution = (int(fig.get_figheight() * fig.dpi), int(fig.get_figwidth() * fig.dpi))
+    target_h, target_w = resolution
+    by = n_rows // target_h if n_rows > 2 * target_h else 1
+    bx = n_cols // target_w if n_cols > 2 * target_w else 1
+
+    image = big_array
+    if by > 1 or bx > 1:
+        image = block_reduce_max(big_array, by, bx)
+    # one contiguous float32 copy up front (if needed at all), rather than
+    # matplotlib converting float64 / strided data internally on every draw
+    if image.dtype != np.uint8 and (image.dtype != np.float32
+                                    or not image.flags["C_CONTIGUOUS"]):
+        image = np.ascontiguousarray(image, dtype=np.float32)
+    # extent in original indices, so burst labels line up with the image
+    extent = (-0.5, image.shape[1] * bx - 0.5, -0.5, image.shape[0] * by - 0.5)
+
+    # --- Colormap once into a uint8 RGBA image: every draw (and every
+    # zoom/pan redraw) then just blits pixels, skipping Normalize + colormap ---
+    vmin, vmax = display_limits(image)
+    norm = _get_norm(vmin, vmax)
+    colormap = _get_cmap(cmap) if isinstance(cmap, str) else cmap
+    rgba = colormap(norm(image), bytes=True)  # NaN -> transparent "bad" colour
+
+    if im is not None:
+        # reuse the existing AxesImage: only its pixels and extent change
+        im.set_data(rgba)
+        im.set_extent(extent)
+    else:
+        # nearest-neighbour on the RGBA image: a plain pixel gather per draw
+        # instead of running an antialiasing kernel over every output pixel
+        im = ax.imshow(
+            rgba,
+            aspect="auto",
+            origin="lower",
+            interpolation="nearest",
+            interpolation_stage="rgba",
+            resample=False,
+            extent=extent
+        )
+        ax.set_xlabel("Time index")
+        ax.set_ylabel("Frequency bin")
+        ax.set_title("Spectrogram")
+
+    if show_colorbar:
+        # the image holds no data values, so the colorbar gets its own
+        # mappable; it is kept on im so later calls update it in place
+        mappable = plt.cm.ScalarMappable(norm=norm, cmap=colormap)
+        if im.colorbar is not None:
+            im.colorbar.update_normal(mappable)
+        else:
+            im.colorbar = fig.colorbar(mappable, ax=ax, label="Intensity")
+
+    # drop burst markers left over from a previous call on these axes
+    for collection in list(ax.collections):
+        if collection.get_gid() == "burst_labels":
+            collection.remove()
 
     #optionally plot vertical lines at the burst start/end
     if label_file is not None:
-        burst_labels = np.load(label_file, allow_pickle=True)
-        print(burst_labels)
-        for entry in burst_labels:
-            start = entry["start_idx"]
-            end = entry["end_idx"]
-            plt.axvline(start, color="red", linestyle="--", alpha=0.7)
-            plt.axvline(end, color="red", linestyle="--", alpha=0.7)
-            
-    plt.show()
+        if isinstance(label_file, np.ndarray):
+            burst_labels = label_file  # already loaded by the caller
+        else:
+            burst_labels = load_burst_labels(label_file)
+        starts = np.asarray(burst_labels["start_idx"], dtype=np.int64)
+        ends = np.asarray(burst_labels["end_idx"], dtype=np.int64)
+
+        # one LineCollection for all start/end markers instead of 2 axvlines
+        # per burst; x in data coords, y spanning the axes (0 -> 1) like axvline
+        xs = np.concatenate([starts, ends])
+        segments = np.empty((xs.size, 2, 2))
+        segments[:, :, 0] = xs[:, None]
+        segments[:, 0, 1] = 0.0
+        segments[:, 1, 1] = 1.0
+        ax.add_collection(LineCollection(segments, colors="red", linestyles="--", alpha=0.7,
+                                         transform=ax.get_xaxis_transform(),
+                                         gid="burst_labels"),
+                          autolim=False)
+
+    if save_path is not None:
+        # vector formats embed the image as one raster instead of per-pixel paths
+        if os.path.splitext(save_path)[1].lower() in (".pdf", ".svg", ".eps", ".ps"):
+            im.set_rasterized(True)
+        fig.savefig(save_path, dpi=100)
+    elif plt.get_backend().lower() in _NON_INTERACTIVE_BACKENDS:
+        # plt.show() would silently do nothing here
+        warnings.warn(f"matplotlib backend {plt.get_backend()!r} cannot show a window; "
+                      "pass save_path to write the figure to a file", RuntimeWarning)
+    else:
+        plt.show()
+
+    return fig, ax, im
+
+def _parse_resolution(text: str):
+    """argparse type for --downsample: "WIDTHxHEIGHT" -> (rows, cols)."""
+    try:
+        width, height = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT in pixels, got {text!r}")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError(f"WIDTHxHEIGHT must both be positive, got {text!r}")
+    return height, width
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2 and len(sys.argv) != 3:
-        print("Usage: python plot_spectrogram.py <spectrogram_file_path> [labels_file_path]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Plot a 2D spectrogram stored as a .npy file.")
+    parser.add_argument("spec_file", help="spectrogram .npy file (frequency x time)")
+    parser.add_argument("labels_file", nargs="?", default=None,
+                        help="optional burst labels .npy file (start_idx/end_idx)")
+    parser.add_argument("--mmap", action=argparse.BooleanOptionalAction, default=True,
+                        help="memory-map the spectrogram instead of reading it into RAM")
+    parser.add_argument("--downsample", metavar="WIDTHxHEIGHT", type=_parse_resolution,
+                        default=None,
+                        help="reduce the image to about this many pixels before drawing "
+                             "(default: the figure's pixel size)")
+    parser.add_argument("--save", metavar="PATH", default=None,
+                        help="write the figure to PATH instead of showing it")
+    parser.add_argument("--cmap", default="viridis", help="matplotlib colormap name")
+    parser.add_argument("--backend", metavar="NAME", default=None,
+                        help="matplotlib backend, e.g. Agg or QtAgg "
+                             "(default: Agg with --save or no display, else matplotlib's)")
+    parser.add_argument("--colorbar", action=argparse.BooleanOptionalAction, default=None,
+                        help="draw a colorbar (default: on, off with --save)")
+    args = parser.parse_args()
+    if args.spec_file.endswith("_mask_packed.npy"):
+        # cont_3sig's bit-packed mask: its uint8 bytes would plot as noise
+        parser.error("a *_mask_packed.npy file is a bit-packed mask, not a spectrogram; "
+                     "see cont_3sig.load_cleaned()/load_bursts() to view the results")
+
+    # Batch runs (--save) and displayless Linux sessions use the Agg backend,
+    # skipping GUI backend setup; an explicit --backend or MPLBACKEND wins
+    if args.backend is not None:
+        try:
+            matplotlib.use(args.backend)
+        except (ValueError, ImportError) as e:
+            parser.error(f"--backend {args.backend}: {e}")
+    elif "MPLBACKEND" not in os.environ:
+        if args.save is None and not _has_display():
+            parser.error("no display available to show the plot; use --save PATH")
+        if args.save is not None or not _has_display():
+            matplotlib.use("Agg")
+
+    # Load the labels on a background thread while the spectrogram loads,
+    # so the smaller read is hidden behind the larger one
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        labels_future = None
+        if args.labels_file is not None:
+            labels_future = pool.submit(load_burst_labels, args.labels_file)
+
+        if args.mmap:
+            # memory-mapped: only the pages matplotlib actually samples get read
+            data = open_memmap(args.spec_file, mode="r")
+        else:
+            data = np.load(args.spec_file)
 
-    spec_file_path = sys.argv[1]
+        labels = labels_future.result() if labels_future is not None else None
 
-    label_file_path = None
-    if len(sys.argv) == 3:
-        label_file_path = sys.argv[2]
+    show_colorbar = args.colorbar if args.colorbar is not None else args.save is None
 
-    data = np.load(spec_file_path)
-    plot_spectrogram(data, label_file_path)
-    
-    
\ No newline at end of file
+    plot_spectrogram(data, labels, cmap=args.cmap, resolution=args.downsample,
+                     save_path=args.save, show_colorbar=show_colorbar)